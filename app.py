@@ -1,13 +1,101 @@
 from flask import Flask, request, render_template, redirect, url_for, jsonify
+from flask.json.provider import DefaultJSONProvider
 import os
 import requests
-import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+import copy
+import functools
 import json
+import logging
+import logging.handlers
+import queue
 import re
+import string
+import threading
+import time
+
+try:
+    import orjson  # C-extension JSON, several times faster than stdlib
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj).decode()
+else:
+    _json_loads = json.loads
+    _json_dumps = json.dumps
 
 app = Flask(__name__)
 
+
+class _ORJSONProvider(DefaultJSONProvider):
+    """Route Flask's request/response JSON through orjson."""
+
+    def dumps(self, obj, **kwargs):
+        return _json_dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return _json_loads(s)
+
+
+if orjson is not None:
+    app.json = _ORJSONProvider(app)
+
+# Dispatcher concurrency; the per-host connection pool below is sized to
+# match so every in-flight post reuses a pooled keep-alive connection
+# instead of urllib3 silently discarding connections beyond its default
+# pool_maxsize of 10 during bursts.
+MAX_WORKERS = 16
+
+# Connect/read timeout applied to every provider post; a dead provider
+# costs at most a couple of seconds instead of a 10 s stall per attempt.
+REQUEST_TIMEOUT = (2, 5)
+
+# Shared HTTP session so provider connections are pooled and reused
+# (keep-alive) instead of paying TCP+TLS setup on every alert. Retries
+# must list POST explicitly: urllib3 excludes it by default.
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=MAX_WORKERS,
+    max_retries=Retry(
+        total=3,
+        connect=2,
+        read=2,
+        backoff_factor=0.3,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=["POST"],
+    ),
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+# Providers are independent, so deliveries fan out in parallel instead of
+# running one after another.
+EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
+# Delivery workers hand log records to a queue; a background listener does
+# the actual stdout write, so workers never serialize on the stream lock.
+_log_queue = queue.Queue(-1)
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+log.addHandler(logging.handlers.QueueHandler(_log_queue))
+log.propagate = False
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Storage stays a plain ini-like text file on purpose: it is the documented
+# config format (see README), human-editable, and trivially volume-mounted.
+# Reads are served from the in-memory mtime cache, so the file is only
+# touched when it actually changes; rosters here are small enough that a
+# database would add operational weight without a measurable win.
 NUMBERS_FILE = os.path.join(BASE_DIR, "numbers.txt")
 TEMPLATE_FILE = os.path.join(BASE_DIR, "template.txt")
 
@@ -17,76 +105,174 @@ DEFAULT_TEMPLATE = "{status} {summary}"
 
 
 # ---------------- UTILITIES ---------------- #
+@dataclass(slots=True)
+class Provider:
+    """Normalized provider config; kind is classified once from the URL."""
+
+    url: str
+    headers: dict = field(default_factory=dict)
+    rate_limit: dict = field(default_factory=dict)
+    # Kavenegar-style APIs take comma-separated receptors in one call;
+    # providers that need one post per number set "batch": false.
+    batch: bool = True
+    kind: str = field(init=False)
+
+    def __post_init__(self):
+        self.kind = "webhook" if "/hooks/" in self.url else "sms"
+
+
+def _make_provider(raw):
+    """Normalize a raw provider entry (bare URL or JSON dict) to a Provider."""
+    if isinstance(raw, dict):
+        return Provider(
+            url=raw.get("url") or "",
+            headers=raw.get("headers") or {},
+            rate_limit=raw.get("rate_limit") or {},
+            batch=raw.get("batch", True),
+        )
+    return Provider(url=raw or "")
+
+
+def _provider_to_line(provider):
+    """Serialize a Provider back to its numbers.txt line form."""
+    extras = {}
+    if provider.headers:
+        extras["headers"] = provider.headers
+    if provider.rate_limit:
+        extras["rate_limit"] = provider.rate_limit
+    if not provider.batch:
+        extras["batch"] = False
+    if extras:
+        return _json_dumps({"url": provider.url, **extras})
+    return provider.url
+
+
+
+# Parsed numbers.txt cached in memory, keyed on file mtime so the hot
+# /alert path skips disk I/O + re-parsing until the file actually changes.
+_NUMBERS_CACHE = {"mtime": None, "data": None}
+_NUMBERS_LOCK = threading.Lock()
+
+# One compiled pattern tokenizes the whole file in a single pass: each match
+# is either a [section] header or a non-blank entry line.
+_NUMBERS_RE = re.compile(
+    r'^[ \t]*(?:\[(?P<section>[^\]\n]+)\][ \t]*|(?P<entry>\S[^\n]*?)[ \t]*)$',
+    re.MULTILINE,
+)
+
+
 def load_numbers():
-    """Load numbers + SMS providers from file"""
+    """Load numbers + SMS providers from file (cached until the file changes)"""
     if not os.path.exists(NUMBERS_FILE):
         with open(NUMBERS_FILE, "w") as f:
             for t in TEAMS:
                 f.write(f"[{t}]\n\n")
             f.write("[sms_provider]\n\n")
 
+    mtime = os.stat(NUMBERS_FILE).st_mtime_ns
+    with _NUMBERS_LOCK:
+        if mtime == _NUMBERS_CACHE["mtime"]:
+            # Routes mutate what we return, so hand out a copy
+            return copy.deepcopy(_NUMBERS_CACHE["data"])
+
     with open(NUMBERS_FILE, "r") as f:
         content = f.read()
 
-    teams = {t: [] for t in TEAMS}
+    # Teams map number -> description, so membership checks and dedup are
+    # O(1) instead of scanning lists.
+    teams = {t: {} for t in TEAMS}
     providers = []
     current_team = None
 
-    for line in content.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        if line.startswith("[") and line.endswith("]"):
-            section = line[1:-1].strip()
-            if section in TEAMS:
+    for match in _NUMBERS_RE.finditer(content):
+        section = match.group("section")
+        if section is not None:
+            section = section.strip()
+            if section in TEAMS or section == "sms_provider":
                 current_team = section
-            elif section == "sms_provider":
-                current_team = "sms_provider"
         elif current_team == "sms_provider":
+            line = match.group("entry")
             try:
-                provider = json.loads(line) if line.startswith("{") else line
-                providers.append(provider)
+                raw = _json_loads(line) if line[0] == "{" else line
             except Exception:
-                providers.append(line)
+                raw = line
+            providers.append(_make_provider(raw))
         elif current_team and current_team in TEAMS:
-            parts = line.split("|", 1)
-            number = parts[0].strip()
-            desc = parts[1].strip() if len(parts) > 1 else ""
-            teams[current_team].append({"number": number, "desc": desc})
+            number, _, desc = match.group("entry").partition("|")
+            teams[current_team].setdefault(number.strip(), desc.strip())
+
+    with _NUMBERS_LOCK:
+        _NUMBERS_CACHE["mtime"] = mtime
+        _NUMBERS_CACHE["data"] = (copy.deepcopy(teams), copy.deepcopy(providers))
 
     return teams, providers
 
 
 def save_numbers(teams, providers):
-    """Save numbers + providers back to file"""
-    with open(NUMBERS_FILE, "w") as f:
-        for t in TEAMS:
-            f.write(f"[{t}]\n")
-            for entry in teams[t]:
-                number = entry["number"]
-                desc = entry.get("desc", "")
-                if desc:
-                    f.write(f"{number} | {desc}\n")
-                else:
-                    f.write(f"{number}\n")
-            f.write("\n")
-
-        f.write("[sms_provider]\n")
-        for p in providers:
-            if isinstance(p, dict):
-                f.write(json.dumps(p) + "\n")
-            else:
-                f.write(str(p) + "\n")
+    """Save numbers + providers back to file (atomically, via tmp+rename)"""
+    tmp_path = NUMBERS_FILE + ".tmp"
+
+    # Hold the lock for the whole rewrite so concurrent mutations cannot
+    # interleave, and replace atomically so a crash mid-write never leaves
+    # a truncated numbers.txt behind.
+    with _NUMBERS_LOCK:
+        _NUMBERS_CACHE["mtime"] = None
+        _NUMBERS_CACHE["data"] = None
+
+        with open(tmp_path, "w") as f:
+            for t in TEAMS:
+                f.write(f"[{t}]\n")
+                for number, desc in teams[t].items():
+                    if desc:
+                        f.write(f"{number} | {desc}\n")
+                    else:
+                        f.write(f"{number}\n")
+                f.write("\n")
+
+            f.write("[sms_provider]\n")
+            for p in providers:
+                f.write(_provider_to_line(p) + "\n")
+
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, NUMBERS_FILE)
+
+
+# Same mtime-cache pattern as the numbers file; a missing template.txt is
+# cached too (as None) so the hot path never stats+opens twice.
+_TEMPLATE_MISSING = -1
+_TEMPLATE_CACHE = {"mtime": None, "text": None}
+_TEMPLATE_LOCK = threading.Lock()
 
 
 def get_template():
-    if os.path.exists(TEMPLATE_FILE):
+    try:
+        mtime = os.stat(TEMPLATE_FILE).st_mtime_ns
+    except OSError:
+        mtime = _TEMPLATE_MISSING
+
+    with _TEMPLATE_LOCK:
+        if mtime == _TEMPLATE_CACHE["mtime"]:
+            return _TEMPLATE_CACHE["text"]
+
+    text = None
+    if mtime != _TEMPLATE_MISSING:
         with open(TEMPLATE_FILE, "r") as f:
-            return f.read().strip()
-    return None
+            text = f.read().strip()
+
+    with _TEMPLATE_LOCK:
+        _TEMPLATE_CACHE["mtime"] = mtime
+        _TEMPLATE_CACHE["text"] = text
+
+    return text
 
 
 def save_template(template):
+    with _TEMPLATE_LOCK:
+        _TEMPLATE_CACHE["mtime"] = None
+        _TEMPLATE_CACHE["text"] = None
+
     if not template:
         if os.path.exists(TEMPLATE_FILE):
             os.remove(TEMPLATE_FILE)
@@ -95,84 +281,200 @@ def save_template(template):
             f.write(template)
 
 
+class _SafeDict(dict):
+    """Format mapping that renders unknown placeholders as empty strings."""
+
+    def __missing__(self, key):
+        return ""
+
+
+@functools.lru_cache(maxsize=32)
+def _compile_template(template):
+    """Pre-parse a template into a render closure, cached per unique string.
+
+    Skips str.format's per-call tokenization: the template is parsed once
+    into (literal, field) segments and rendering is appends plus a join.
+    Templates using format specs, conversions, or nested field access fall
+    back to full format_map semantics.
+    """
+    segments = list(string.Formatter().parse(template))
+
+    for _, field, spec, conv in segments:
+        if field is not None and (spec or conv or "." in field or "[" in field):
+            return template.format_map
+
+    def render(values):
+        out = []
+        for literal, field, _, _ in segments:
+            if literal:
+                out.append(literal)
+            if field is not None:
+                out.append(str(values.get(field, "")))
+        return "".join(out)
+
+    return render
+
+
 def build_message(data, custom_template=None):
     messages = []
-    template = custom_template if custom_template else DEFAULT_TEMPLATE
+    # Compiled once per unique template; missing placeholders render blank
+    # either way (_SafeDict covers the format_map fallback).
+    fmt = _compile_template(custom_template if custom_template else DEFAULT_TEMPLATE)
 
     if "alerts" in data:  # Grafana/Alertmanager webhook
         for a in data["alerts"]:
-            status = a.get("status", "firing")
             annotations = a.get("annotations", {})
-            summary = annotations.get("summary", "No summary")
-            description = annotations.get("description", "")
-            alertname = a.get("labels", {}).get("alertname", "")
-            msg = template.format(
-                status=status, summary=summary,
-                description=description, alertname=alertname
-            )
-            messages.append(msg)
+            messages.append(fmt(_SafeDict(
+                status=a.get("status", "firing"),
+                summary=annotations.get("summary", "No summary"),
+                description=annotations.get("description", ""),
+                alertname=a.get("labels", {}).get("alertname", ""),
+            )))
 
     elif "title" in data and "state" in data:  # Grafana newer format
-        status = data.get("state", "firing")
-        summary = data.get("message", "No message")
-        alertname = data.get("ruleName", "")
-        msg = template.format(status=status, summary=summary, alertname=alertname)
-        messages.append(msg)
+        messages.append(fmt(_SafeDict(
+            status=data.get("state", "firing"),
+            summary=data.get("message", "No message"),
+            alertname=data.get("ruleName", ""),
+        )))
 
     return "\n".join(messages)
 
 
-def send_sms(numbers, message, providers):
-    """Send alerts via SMS providers and webhook providers."""
+class _TokenBucket:
+    """Token bucket allowing `rps` requests per second for one provider."""
+
+    def __init__(self, rps):
+        self.rps = rps
+        self.tokens = float(rps)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Block until a token is available, then consume it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(float(self.rps), self.tokens + (now - self.updated) * self.rps)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                shortfall = (1 - self.tokens) / self.rps
+            time.sleep(shortfall)
+
 
-    for provider in providers:
+_BUCKETS = {}
+_BUCKETS_LOCK = threading.Lock()
+
+
+def _rate_limiter(provider):
+    """Return the provider's token bucket, or None if it is not rate-limited.
+
+    Providers opt in via a "rate_limit" key in their JSON config, e.g.
+    {"url": "...", "rate_limit": {"rps": 2}}.
+    """
+    rps = provider.rate_limit.get("rps")
+    if not rps:
+        return None
+    with _BUCKETS_LOCK:
+        bucket = _BUCKETS.get(provider.url)
+        if bucket is None:
+            bucket = _BUCKETS[provider.url] = _TokenBucket(rps)
+        return bucket
+
+
+def _send_via_provider(provider, numbers, message):
+    """Deliver one alert through a single provider (runs in a worker thread)."""
+    url = provider.url
+    headers = provider.headers
+
+    if not url:
+        return
+
+    limiter = _rate_limiter(provider)
+
+    # 🚀 Webhook providers (Rocket.Chat, Slack, etc.)
+    if provider.kind == "webhook":
+        if limiter:
+            limiter.wait()
+        payload = {"text": message}
+        resp = SESSION.post(url, json=payload, headers=headers, timeout=REQUEST_TIMEOUT)
+        log.info("[Webhook] sent via %s: %s %s", url, resp.status_code, resp.text)
+
+    # 📱 SMS providers (like Kavenegar)
+    elif provider.batch:
+        if not numbers:
+            return
+        if limiter:
+            limiter.wait()
+        # One round-trip for the whole team: the API accepts a
+        # comma-separated receptor list
+        payload = {"receptor": ",".join(numbers), "message": message}
+        # 🔑 IMPORTANT: SMS API expects form data, not JSON
+        resp = SESSION.post(url, data=payload, headers=headers, timeout=REQUEST_TIMEOUT)
+        log.info("[SMS] to %s receptor(s) via %s: %s %s", len(numbers), url, resp.status_code, resp.text)
+
+    else:
+        for number in numbers:
+            if limiter:
+                limiter.wait()
+            payload = {"receptor": number, "message": message}
+            # 🔑 IMPORTANT: SMS API expects form data, not JSON
+            resp = SESSION.post(url, data=payload, headers=headers, timeout=REQUEST_TIMEOUT)
+            log.info("[SMS] to %s via %s: %s %s", number, url, resp.status_code, resp.text)
+
+
+def send_sms(numbers, message, providers):
+    """Send alerts via SMS providers and webhook providers (in parallel)."""
+    futures = {
+        EXECUTOR.submit(_send_via_provider, provider, numbers, message): provider
+        for provider in providers
+    }
+    for future in as_completed(futures):
+        provider = futures[future]
         try:
-            if isinstance(provider, dict):
-                url = provider.get("url")
-                headers = provider.get("headers", {})
-            else:
-                url = provider
-                headers = {}
-
-            if not url:
-                continue
-
-            # 🚀 Webhook providers (Rocket.Chat, Slack, etc.)
-            if "/hooks/" in url:
-                payload = {"text": message}
-                resp = requests.post(url, json=payload, headers=headers, timeout=10)
-                print(f"[Webhook] sent via {url}: {resp.status_code} {resp.text}")
-
-            # 📱 SMS providers (like Kavenegar)
-            else:
-                seen_numbers = set()
-                for number in numbers:
-                    if number in seen_numbers:
-                        continue
-                    seen_numbers.add(number)
-
-                    payload = {"receptor": number, "message": message}
-                    # 🔑 IMPORTANT: SMS API expects form data, not JSON
-                    resp = requests.post(url, data=payload, headers=headers, timeout=10)
-                    print(f"[SMS] to {number} via {url}: {resp.status_code} {resp.text}")
+            future.result()
+        except Exception as e:
+            log.error("❌ Failed to send via provider %s: %s", provider, e)
+
 
+# Alerts are delivered from a background worker so /alert can acknowledge
+# immediately; a bounded queue makes the upstream back off when we are full
+# instead of piling up retries.
+ALERT_QUEUE = queue.Queue(maxsize=10_000)
+
+
+def _alert_worker():
+    while True:
+        numbers, message, providers = ALERT_QUEUE.get()
+        try:
+            send_sms(numbers, message, providers)
         except Exception as e:
-            print(f"❌ Failed to send via provider {provider}: {e}")
+            log.error("❌ Alert delivery failed: %s", e)
+        finally:
+            ALERT_QUEUE.task_done()
+
 
-        time.sleep(1)
+threading.Thread(target=_alert_worker, daemon=True).start()
 
 
 # ---------------- SECURITY ---------------- #
+# Compiled once at import; mask_url runs per provider on every page render.
+_RE_SECRET_QS = re.compile(r'(?i)(apikey|token|key|secret)=([^&]+)')
+_RE_LONG_SEG = re.compile(r'/[A-Za-z0-9]{20,}(?=/|$)')
+
+
 def mask_url(url: str) -> str:
     """Mask sensitive tokens inside query strings and path segments."""
     if not url:
         return url
 
     # Mask common query params (apikey, token, key, secret)
-    url = re.sub(r'(?i)(apikey|token|key|secret)=([^&]+)', r'\1=*****', url)
+    url = _RE_SECRET_QS.sub(r'\1=*****', url)
 
     # Mask long random path segments (20+ chars alphanumeric)
-    url = re.sub(r'/[A-Za-z0-9]{20,}(?=/|$)', r'/*****', url)
+    url = _RE_LONG_SEG.sub(r'/*****', url)
 
     return url
 
@@ -188,16 +490,10 @@ def mask_headers(headers: dict) -> dict:
 
 def mask_providers(providers):
     """Return a copy of providers with masked headers + URLs for UI"""
-    safe_providers = []
-    for p in providers:
-        if isinstance(p, dict):
-            safe_providers.append({
-                "url": mask_url(p.get("url")),
-                "headers": mask_headers(p.get("headers", {}))
-            })
-        else:
-            safe_providers.append(mask_url(p))
-    return safe_providers
+    return [
+        {"url": mask_url(p.url), "headers": mask_headers(p.headers)}
+        for p in providers
+    ]
 
 
 # ---------------- ROUTES ---------------- #
@@ -216,10 +512,8 @@ def add_number(team):
     teams, providers = load_numbers()
 
     if team in teams and number:
-        if not any(entry["number"] == number for entry in teams[team]):
-            teams[team].append({"number": number, "desc": desc})
-        if not any(entry["number"] == number for entry in teams["all"]):
-            teams["all"].append({"number": number, "desc": desc})
+        teams[team].setdefault(number, desc)
+        teams["all"].setdefault(number, desc)
         save_numbers(teams, providers)
 
     return redirect(url_for("index"))
@@ -229,7 +523,7 @@ def add_number(team):
 def remove_number(team, number):
     teams, providers = load_numbers()
     if team in teams:
-        teams[team] = [n for n in teams[team] if n["number"] != number]
+        teams[team].pop(number, None)
         save_numbers(teams, providers)
     return redirect(url_for("index"))
 
@@ -243,11 +537,11 @@ def add_provider():
     headers = {}
     if headers_raw:
         try:
-            headers = json.loads(headers_raw)
+            headers = _json_loads(headers_raw)
         except Exception:
             pass
 
-    provider = {"url": url, "headers": headers} if headers else url
+    provider = _make_provider({"url": url, "headers": headers} if headers else url)
     if provider not in providers:
         providers.append(provider)
 
@@ -273,23 +567,24 @@ def set_template():
 
 @app.route("/alert/<team>", methods=["POST"])
 def alert(team):
-    data = request.get_json(force=True)
+    # Parse the raw body directly: skips Flask's content-type negotiation
+    # and goes through orjson when it is available.
+    try:
+        data = _json_loads(request.get_data())
+    except Exception:
+        return jsonify({"status": "invalid json"}), 400
     template = get_template()
     teams, providers = load_numbers()
 
-    entries = teams.get(team, [])
-    seen = set()
-    unique_numbers = []
-    for entry in entries:
-        number = entry["number"]
-        if number not in seen:
-            seen.add(number)
-            unique_numbers.append(number)
+    unique_numbers = list(teams.get(team, {}))
 
     message = build_message(data, template)
-    send_sms(unique_numbers, message, providers)
+    try:
+        ALERT_QUEUE.put_nowait((unique_numbers, message, providers))
+    except queue.Full:
+        return jsonify({"status": "overloaded"}), 503
 
-    return jsonify({"status": "ok", "sent_to": unique_numbers})
+    return jsonify({"status": "queued", "sent_to": unique_numbers}), 202
 
 
 if __name__ == "__main__":